@@ -1,56 +1,171 @@
-from flask import Flask, render_template, jsonify, request, redirect, url_for, flash
-from flask_migrate import Migrate
+from flask import Flask, render_template, jsonify, request, redirect, url_for, flash, abort, g, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+from flask_caching import Cache
+from flask_compress import Compress
+from flask_migrate import Migrate, stamp, upgrade
+from sqlalchemy.orm import joinedload
+import orjson
 import random
+import zlib
 from datetime import datetime, timedelta
+from functools import wraps
 from config import Config
-from models import db, User, InventoryItem, ActivityLog
+from models import db, User, InventoryItem, ActivityLog, CategoryTotal
+
+class OrjsonProvider(DefaultJSONProvider):
+    """orjson-backed JSON provider whose output matches jsonify's"""
+
+    def dumps_bytes(self, obj):
+        # Sort keys when Flask would, allow non-string keys, and hand datetimes
+        # to Flask's default() so they stay HTTP dates rather than ISO 8601
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option)
+
+    def dumps(self, obj, **kwargs):
+        return self.dumps_bytes(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj), mimetype=self.mimetype)
 
 # Initialize Flask app
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 app.config.from_object(Config)
 
 # Initialize database
 db.init_app(app)
-migrate = Migrate(app, db)
+migrate = Migrate(app, db, render_as_batch=True)
+
+# Initialize response cache and compression
+cache = Cache(app)
+Compress(app)
+
+# Cache lifetimes (seconds) for the read-heavy dashboard endpoints
+CACHE_SHORT = 10
+CACHE_NORMAL = 30
+
+# Inventories larger than this are streamed instead of built in memory
+STREAM_THRESHOLD = 1000
+STREAM_BATCH_SIZE = 500
+
+def cacheable(response, max_age):
+    # Let browsers and proxies reuse the response for as long as we cache it
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    return response
+
+def stream_json_array(rows, serialize):
+    # Emit a JSON array one element at a time so memory stays flat for large results
+    def generate():
+        yield b'['
+        for i, row in enumerate(rows):
+            if i:
+                yield b','
+            yield app.json.dumps_bytes(serialize(row))
+        yield b']'
+    return app.response_class(stream_with_context(generate()), mimetype='application/json')
+
+def inventory_version():
+    # Changes on any item write, and daily so relative 'Today'/'Yesterday' labels roll over.
+    # Read once per request, so the ETag, the cache key and the view all agree.
+    # Returns (etag, last_modified, row_count)
+    if 'inventory_version' not in g:
+        latest, count = db.session.query(
+            db.func.max(InventoryItem.last_updated),
+            db.func.count(InventoryItem.id)
+        ).one()
+        # Not security sensitive, so a cheap checksum is enough for the tag
+        etag = format(zlib.crc32(f"{latest}:{count}:{datetime.utcnow().date()}".encode()), '08x')
+        g.inventory_version = (etag, latest, count)
+    return g.inventory_version
+
+def inventory_cache_key(name):
+    # Cached bodies are keyed by inventory version: a write in any worker moves
+    # readers to a new key, so a cached body never outlives the ETag it matches
+    return lambda: f"{name}:{inventory_version()[0]}"
+
+def conditional(view):
+    # Answer polls whose ETag still matches with 304 before reading or serializing rows
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        etag, last_modified, _count = inventory_version()
+        if etag in request.if_none_match:
+            response = app.response_class(status=304)
+        else:
+            response = view(*args, **kwargs)
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        return response
+    return wrapper
 
 @app.route('/')
 def dashboard():
     return render_template('dashboard.html')
 
 @app.route('/api/inventory')
+@conditional
+@cache.cached(timeout=CACHE_NORMAL, key_prefix=inventory_cache_key('inv_all'),
+              response_filter=lambda response: not response.is_streamed)
 def api_inventory():
-    # Get all inventory items from database
-    items = InventoryItem.query.all()
-    return jsonify([item.serialize() for item in items])
+    # Get all inventory items from database, selecting plain columns to skip
+    # ORM hydration (serialization only reads columns, no relationships)
+    query = db.session.query(
+        InventoryItem.id,
+        InventoryItem.name,
+        InventoryItem.category,
+        InventoryItem.location,
+        InventoryItem.quantity,
+        InventoryItem.status,
+        InventoryItem.last_updated,
+        InventoryItem.expiration_date
+    )
+    now = datetime.utcnow()
+    
+    # Large inventories are streamed in batches (and not cached) instead of materialized
+    _etag, _last_modified, count = inventory_version()
+    if count > STREAM_THRESHOLD:
+        rows = query.yield_per(STREAM_BATCH_SIZE)
+        return cacheable(stream_json_array(rows, lambda row: InventoryItem.serialize_row(row, now)), CACHE_NORMAL)
+    
+    rows = query.all()
+    return cacheable(jsonify([InventoryItem.serialize_row(row, now) for row in rows]), CACHE_NORMAL)
 
 @app.route('/api/inventory/categories')
+@conditional
+@cache.cached(timeout=CACHE_NORMAL, key_prefix=inventory_cache_key('inv_cats'))
 def api_inventory_categories():
-    # Get inventory counts by category
-    categories = db.session.query(
-        InventoryItem.category, 
-        db.func.sum(InventoryItem.quantity).label('total')
-    ).group_by(InventoryItem.category).all()
+    # Get inventory counts by category from the maintained rollup table
+    categories = db.session.query(CategoryTotal.category, CategoryTotal.total).all()
     
-    return jsonify([{
+    return cacheable(jsonify([{
         'category': cat,
         'total': total
-    } for cat, total in categories])
+    } for cat, total in categories]), CACHE_NORMAL)
 
 @app.route('/api/inventory/expiring')
+@cache.cached(timeout=CACHE_SHORT, key_prefix=inventory_cache_key('inv_exp'))
 def api_inventory_expiring():
     # Get items expiring soon (within 30 days)
-    thirty_days = datetime.utcnow() + timedelta(days=30)
+    now = datetime.utcnow()
+    thirty_days = now + timedelta(days=30)
     items = InventoryItem.query.filter(
         InventoryItem.expiration_date.isnot(None),
         InventoryItem.expiration_date <= thirty_days
     ).order_by(InventoryItem.expiration_date).all()
     
-    return jsonify([item.serialize() for item in items])
+    return cacheable(jsonify([item.serialize(now) for item in items]), CACHE_SHORT)
 
 @app.route('/api/activity')
 def api_activity():
-    # Get recent activities
-    activities = ActivityLog.query.order_by(ActivityLog.timestamp.desc()).limit(10).all()
+    # Get recent activities, joining the item so serialize() doesn't lazy-load it per row
+    activities = ActivityLog.query.options(joinedload(ActivityLog.item)) \
+        .order_by(ActivityLog.timestamp.desc()).limit(10).all()
     return jsonify([activity.serialize() for activity in activities])
 
 @app.route('/api/estimate', methods=['POST'])
@@ -80,14 +195,7 @@ def update_inventory():
     
     # Update item
     item.quantity = new_quantity
-    
-    # Update status based on quantity
-    if new_quantity < 50:
-        item.status = 'low'
-    elif new_quantity < 200:
-        item.status = 'medium'
-    else:
-        item.status = 'good'
+    CategoryTotal.adjust(item.category, quantity_change)
     
     item.last_updated = datetime.utcnow()
     
@@ -104,95 +212,138 @@ def update_inventory():
     
     return jsonify(success=True)
 
+@app.route('/update_inventory_bulk', methods=['POST'])
+def update_inventory_bulk():
+    data = request.json
+    new_quantities = {u['id']: u['quantity'] for u in data.get('updates', [])}
+    if not new_quantities:
+        return jsonify(success=True, updated=0)
+    
+    # Read current quantities for every item in one query
+    current = db.session.query(
+        InventoryItem.id, InventoryItem.quantity, InventoryItem.category
+    ).filter(InventoryItem.id.in_(new_quantities)).all()
+    if len(current) != len(new_quantities):
+        abort(404)
+    
+    now = datetime.utcnow()
+    item_updates = []
+    activities = []
+    category_changes = {}
+    for item_id, old_quantity, category in current:
+        new_quantity = new_quantities[item_id]
+        quantity_change = new_quantity - old_quantity
+        item_updates.append({'id': item_id, 'quantity': new_quantity, 'last_updated': now})
+        activities.append({
+            'timestamp': now,
+            'action': 'updated',
+            'item_id': item_id,
+            'quantity_change': quantity_change,
+            'description': f"Updated quantity from {old_quantity} to {new_quantity}"
+        })
+        category_changes[category] = category_changes.get(category, 0) + quantity_change
+    
+    # Update items by primary key and log activities as two executemany batches
+    db.session.execute(db.update(InventoryItem), item_updates)
+    db.session.execute(db.insert(ActivityLog), activities)
+    for category, quantity_change in category_changes.items():
+        CategoryTotal.adjust(category, quantity_change)
+    db.session.commit()
+    
+    return jsonify(success=True, updated=len(item_updates))
+
+# Migration matching the schema of databases created before migrations existed
+INITIAL_REVISION = '76bde801f20c'
+
 # Initialize database with sample data
 @app.cli.command('init-db')
 def init_db_command():
     """Initialize the database with sample data."""
-    # Create tables
-    db.create_all()
+    # Create or upgrade tables; older databases are stamped with the initial
+    # revision first so their existing tables aren't created again
+    inspector = db.inspect(db.engine)
+    if inspector.has_table('inventory_item') and not inspector.has_table('alembic_version'):
+        stamp(revision=INITIAL_REVISION)
+    upgrade()
     
     # Check if we already have data
     if InventoryItem.query.count() > 0:
         print('Database already contains data. Skipping initialization.')
         return
     
-    # Create sample inventory items
+    # Seed timestamps are all relative to a single reference time
+    now = datetime.utcnow()
+    
+    # Create sample inventory items (inserted in a single executemany batch)
     items = [
-        InventoryItem(
+        dict(
             name="Surgical Masks", 
             category="PPE", 
             location="Storage A", 
             quantity=1250, 
-            status="good", 
-            last_updated=datetime.utcnow() - timedelta(hours=3),
-            expiration_date=datetime.utcnow() + timedelta(days=180)
+            last_updated=now - timedelta(hours=3),
+            expiration_date=now + timedelta(days=180)
         ),
-        InventoryItem(
+        dict(
             name="Nitrile Gloves (M)", 
             category="PPE", 
             location="Storage B", 
             quantity=850, 
-            status="medium", 
-            last_updated=datetime.utcnow() - timedelta(days=1, hours=5),
-            expiration_date=datetime.utcnow() + timedelta(days=365)
+            last_updated=now - timedelta(days=1, hours=5),
+            expiration_date=now + timedelta(days=365)
         ),
-        InventoryItem(
+        dict(
             name="Insulin", 
             category="Medication", 
             location="Pharmacy", 
             quantity=120, 
-            status="low", 
-            last_updated=datetime.utcnow() - timedelta(days=10),
-            expiration_date=datetime.utcnow() + timedelta(days=15)
+            last_updated=now - timedelta(days=10),
+            expiration_date=now + timedelta(days=15)
         ),
-        InventoryItem(
+        dict(
             name="IV Solution (1L)", 
             category="Fluids", 
             location="Storage C", 
             quantity=432, 
-            status="good", 
-            last_updated=datetime.utcnow() - timedelta(days=12),
-            expiration_date=datetime.utcnow() + timedelta(days=180)
+            last_updated=now - timedelta(days=12),
+            expiration_date=now + timedelta(days=180)
         ),
-        InventoryItem(
+        dict(
             name="Syringes (10ml)", 
             category="Supplies", 
             location="Storage A", 
             quantity=75, 
-            status="low", 
-            last_updated=datetime.utcnow() - timedelta(days=13),
-            expiration_date=datetime.utcnow() + timedelta(days=730)
+            last_updated=now - timedelta(days=13),
+            expiration_date=now + timedelta(days=730)
         ),
-        InventoryItem(
+        dict(
             name="Gauze Pads", 
             category="Supplies", 
             location="Storage B", 
             quantity=620, 
-            status="good", 
-            last_updated=datetime.utcnow() - timedelta(days=14),
-            expiration_date=datetime.utcnow() + timedelta(days=365)
+            last_updated=now - timedelta(days=14),
+            expiration_date=now + timedelta(days=365)
         ),
-        InventoryItem(
+        dict(
             name="Ventilator Filters", 
             category="Equipment", 
             location="ICU Storage", 
             quantity=28, 
-            status="low", 
-            last_updated=datetime.utcnow() - timedelta(days=15),
-            expiration_date=datetime.utcnow() + timedelta(days=25)
+            last_updated=now - timedelta(days=15),
+            expiration_date=now + timedelta(days=25)
         ),
-        InventoryItem(
+        dict(
             name="N95 Respirators", 
             category="PPE", 
             location="Storage A", 
             quantity=450, 
-            status="good", 
-            last_updated=datetime.utcnow() - timedelta(days=5),
-            expiration_date=datetime.utcnow() + timedelta(days=545)
+            last_updated=now - timedelta(days=5),
+            expiration_date=now + timedelta(days=545)
         )
     ]
     
-    db.session.add_all(items)
+    db.session.execute(db.insert(InventoryItem), items)
+    CategoryTotal.rebuild()
     
     # Create an admin user
     admin = User(username='admin', email='admin@example.com', role='admin')
@@ -201,22 +352,22 @@ def init_db_command():
     
     # Create sample activities
     activities = [
-        ActivityLog(
-            timestamp=datetime.utcnow() - timedelta(hours=2),
+        dict(
+            timestamp=now - timedelta(hours=2),
             action='added',
             item_id=1,
             quantity_change=50,
             description="Received new shipment of surgical masks"
         ),
-        ActivityLog(
-            timestamp=datetime.utcnow() - timedelta(days=1),
+        dict(
+            timestamp=now - timedelta(days=1),
             action='updated',
             item_id=2,
             quantity_change=-25,
             description="Distributed to Emergency Department"
         ),
-        ActivityLog(
-            timestamp=datetime.utcnow() - timedelta(days=2),
+        dict(
+            timestamp=now - timedelta(days=2),
             action='updated',
             item_id=3,
             quantity_change=-5,
@@ -224,7 +375,7 @@ def init_db_command():
         )
     ]
     
-    db.session.add_all(activities)
+    db.session.execute(db.insert(ActivityLog), activities)
     db.session.commit()
     
     print('Database initialized with sample data!')
@@ -0,0 +1,33 @@
+"""category totals
+
+Revision ID: 2ed90607878c
+Revises: 933b7bb41fc3
+Create Date: 2026-10-15 22:02:57.279687
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2ed90607878c'
+down_revision = '933b7bb41fc3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('category_total',
+        sa.Column('category', sa.String(length=50), nullable=False),
+        sa.Column('total', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('category')
+    )
+    # Backfill from the items already in the inventory
+    op.execute(
+        "INSERT INTO category_total (category, total) "
+        "SELECT category, COALESCE(SUM(quantity), 0) FROM inventory_item GROUP BY category"
+    )
+
+
+def downgrade():
+    op.drop_table('category_total')
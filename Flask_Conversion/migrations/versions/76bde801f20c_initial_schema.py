@@ -0,0 +1,61 @@
+"""initial schema
+
+Revision ID: 76bde801f20c
+Revises: 
+Create Date: 2026-10-15 22:02:07.881534
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '76bde801f20c'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Schema of the original instance/meditrack.db, before any migrations
+    op.create_table('user',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('username', sa.String(length=64), nullable=True),
+        sa.Column('email', sa.String(length=120), nullable=True),
+        sa.Column('password_hash', sa.String(length=128), nullable=True),
+        sa.Column('role', sa.String(length=20), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_user_username', 'user', ['username'], unique=True)
+    op.create_index('ix_user_email', 'user', ['email'], unique=True)
+    op.create_table('inventory_item',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('category', sa.String(length=50), nullable=False),
+        sa.Column('location', sa.String(length=100), nullable=True),
+        sa.Column('quantity', sa.Integer(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=True),
+        sa.Column('last_updated', sa.DateTime(), nullable=True),
+        sa.Column('expiration_date', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('activity_log',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('timestamp', sa.DateTime(), nullable=True),
+        sa.Column('action', sa.String(length=50), nullable=True),
+        sa.Column('item_id', sa.Integer(), nullable=True),
+        sa.Column('quantity_change', sa.Integer(), nullable=True),
+        sa.Column('description', sa.String(length=200), nullable=True),
+        sa.ForeignKeyConstraint(['item_id'], ['inventory_item.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_activity_log_timestamp', 'activity_log', ['timestamp'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_activity_log_timestamp', table_name='activity_log')
+    op.drop_table('activity_log')
+    op.drop_table('inventory_item')
+    op.drop_index('ix_user_email', table_name='user')
+    op.drop_index('ix_user_username', table_name='user')
+    op.drop_table('user')
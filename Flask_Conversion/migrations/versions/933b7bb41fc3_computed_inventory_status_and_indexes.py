@@ -0,0 +1,50 @@
+"""computed inventory status and indexes
+
+Revision ID: 933b7bb41fc3
+Revises: 76bde801f20c
+Create Date: 2026-10-15 22:02:08.664706
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '933b7bb41fc3'
+down_revision = '76bde801f20c'
+branch_labels = None
+depends_on = None
+
+
+STATUS_EXPRESSION = (
+    "CASE WHEN quantity < 50 THEN 'low' WHEN quantity < 200 THEN 'medium' ELSE 'good' END"
+)
+
+
+def upgrade():
+    # A plain column cannot be altered into a generated one, so drop and re-add
+    # it; on SQLite the batch rebuilds the table and copies the other columns.
+    with op.batch_alter_table('inventory_item', recreate='always') as batch_op:
+        batch_op.drop_column('status')
+        batch_op.add_column(sa.Column('status', sa.String(length=20),
+                                      sa.Computed(STATUS_EXPRESSION, persisted=True)))
+        batch_op.create_index('ix_inventory_item_last_updated', ['last_updated'], unique=False)
+        batch_op.create_index('ix_inv_category', ['category'], unique=False)
+        batch_op.create_index('ix_inv_exp', ['expiration_date'], unique=False,
+                              postgresql_where=sa.text('expiration_date IS NOT NULL'))
+        batch_op.create_index('ix_inv_low_stock', ['status'], unique=False,
+                              postgresql_where=sa.text("status = 'low'"),
+                              sqlite_where=sa.text("status = 'low'"))
+
+
+def downgrade():
+    with op.batch_alter_table('inventory_item', recreate='always') as batch_op:
+        batch_op.drop_index('ix_inv_low_stock')
+        batch_op.drop_index('ix_inv_exp')
+        batch_op.drop_index('ix_inv_category')
+        batch_op.drop_index('ix_inventory_item_last_updated')
+        batch_op.drop_column('status')
+        batch_op.add_column(sa.Column('status', sa.String(length=20), nullable=True))
+
+    # Fill the plain column back in from quantity
+    op.execute(f"UPDATE inventory_item SET status = {STATUS_EXPRESSION}")
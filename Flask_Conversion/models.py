@@ -1,9 +1,13 @@
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects import postgresql, sqlite
 from werkzeug.security import generate_password_hash, check_password_hash
 
 db = SQLAlchemy()
 
+# Dialects whose INSERT supports ON CONFLICT DO UPDATE
+UPSERT_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), index=True, unique=True)
@@ -23,37 +27,88 @@ class InventoryItem(db.Model):
     category = db.Column(db.String(50), nullable=False)
     location = db.Column(db.String(100))
     quantity = db.Column(db.Integer, default=0)
-    status = db.Column(db.String(20))  # 'low', 'medium', 'good'
-    last_updated = db.Column(db.DateTime, default=datetime.utcnow)
+    # 'low', 'medium', 'good' -- derived from quantity by the database
+    status = db.Column(db.String(20), db.Computed(
+        "CASE WHEN quantity < 50 THEN 'low' WHEN quantity < 200 THEN 'medium' ELSE 'good' END",
+        persisted=True
+    ))
+    last_updated = db.Column(db.DateTime, index=True, default=datetime.utcnow)
     expiration_date = db.Column(db.DateTime, nullable=True)
     
     activities = db.relationship('ActivityLog', backref='item', lazy='dynamic')
     
-    def serialize(self):
+    __table_args__ = (
+        # Category rollups group by category; the expiring view filters and sorts by date
+        db.Index('ix_inv_category', 'category'),
+        db.Index('ix_inv_exp', 'expiration_date',
+                 postgresql_where=db.text('expiration_date IS NOT NULL')),
+        # Low-stock alerts only ever look at the 'low' band
+        db.Index('ix_inv_low_stock', 'status',
+                 postgresql_where=db.text("status = 'low'"),
+                 sqlite_where=db.text("status = 'low'")),
+    )
+    
+    def serialize(self, now=None):
         """Return object data in easily serializable format"""
+        return self.serialize_row(self, now or datetime.utcnow())
+
+    @staticmethod
+    def serialize_row(row, now):
+        """Serialize an item or a plain row of its columns, relative to `now`"""
+        delta = now - row.last_updated
+        if delta.days == 0:
+            last_updated = f"Today, {row.last_updated.strftime('%I:%M %p')}"
+        elif delta.days == 1:
+            last_updated = f"Yesterday, {row.last_updated.strftime('%I:%M %p')}"
+        elif delta.days < 2:
+            last_updated = None
+        else:
+            last_updated = row.last_updated.strftime("%b %d, %Y")
         return {
-            'id': self.id,
-            'name': self.name,
-            'category': self.category,
-            'location': self.location,
-            'quantity': self.quantity,
-            'status': self.status,
-            'last_updated': self.last_updated.strftime("%b %d, %Y") if not self.is_recent() else self.get_relative_time(),
-            'expiration_date': self.expiration_date.strftime("%Y-%m-%d") if self.expiration_date else None
+            'id': row.id,
+            'name': row.name,
+            'category': row.category,
+            'location': row.location,
+            'quantity': row.quantity,
+            'status': row.status,
+            'last_updated': last_updated,
+            'expiration_date': row.expiration_date.strftime("%Y-%m-%d") if row.expiration_date else None
         }
+
+class CategoryTotal(db.Model):
+    """Running quantity total per category, kept in step with inventory writes"""
+    category = db.Column(db.String(50), primary_key=True)
+    total = db.Column(db.Integer, default=0, nullable=False)
     
-    def is_recent(self):
-        """Check if item was updated today or yesterday"""
-        delta = datetime.utcnow() - self.last_updated
-        return delta.days < 2
+    @classmethod
+    def rebuild(cls):
+        """Recompute every category total from the inventory table"""
+        db.session.execute(db.delete(cls))
+        db.session.execute(db.insert(cls).from_select(
+            ['category', 'total'],
+            db.select(
+                InventoryItem.category,
+                db.func.coalesce(db.func.sum(InventoryItem.quantity), 0)
+            ).group_by(InventoryItem.category)
+        ))
     
-    def get_relative_time(self):
-        """Return 'Today' or 'Yesterday' for recent updates"""
-        delta = datetime.utcnow() - self.last_updated
-        if delta.days == 0:
-            return f"Today, {self.last_updated.strftime('%I:%M %p')}"
-        elif delta.days == 1:
-            return f"Yesterday, {self.last_updated.strftime('%I:%M %p')}"
+    @classmethod
+    def adjust(cls, category, delta):
+        """Apply a quantity change to a category's total, creating its row if needed"""
+        insert = UPSERT_INSERTS.get(db.session.get_bind().dialect.name)
+        if insert is not None:
+            db.session.execute(
+                insert(cls).values(category=category, total=delta).on_conflict_do_update(
+                    index_elements=[cls.category], set_={'total': cls.total + delta}
+                )
+            )
+            return
+        # Other databases: update in place, inserting when the category is new
+        result = db.session.execute(
+            db.update(cls).where(cls.category == category).values(total=cls.total + delta)
+        )
+        if result.rowcount == 0:
+            db.session.execute(db.insert(cls).values(category=category, total=delta))
 
 class ActivityLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -1,30 +1,130 @@
 import os
+import orjson
+import time
+from functools import lru_cache
 from flask import Flask, request, render_template, redirect, url_for, flash, jsonify
+from flask.json.provider import DefaultJSONProvider
 from werkzeug.utils import secure_filename
 import shutil
 
 # Import functions from your existing modules
-from populate_database import load_documents, split_documents, add_to_chroma, clear_database
+from populate_database import iter_documents, split_documents, remove_documents, add_to_chroma, mark_ingested, clear_database
 from query_data import query_rag
+from rag_client import get_db
+
+class OrjsonProvider(DefaultJSONProvider):
+    """orjson-backed JSON provider whose output matches jsonify's"""
+
+    def dumps_bytes(self, obj):
+        # Sort keys when Flask would, allow non-string keys, and hand datetimes
+        # to Flask's default() so they stay HTTP dates rather than ISO 8601
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option)
+
+    def dumps(self, obj, **kwargs):
+        return self.dumps_bytes(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj), mimetype=self.mimetype)
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 app.secret_key = "ragappsecretkey"
 app.config['UPLOAD_FOLDER'] = 'data'
+os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB limit
-ALLOWED_EXTENSIONS = {'pdf'}
+ALLOWED_EXTENSIONS = frozenset({'pdf'})
+
+# Prompt templates for structured medical queries, keyed by query type
+MEDICAL_PROMPTS = {
+    'disease': """
+Based on the uploaded medical resources, identify the possible disease(s) with the following symptoms and patient details:
+Symptoms: {symptoms}
+Patient Details: {patient_details}
+Please list the most likely conditions in order of probability, with brief explanations for each.
+""",
+    'recovery': """
+Based on the uploaded medical resources, estimate the recovery time for a patient with the following details:
+Symptoms: {symptoms}
+Patient Details: {patient_details}
+Please provide a range of expected recovery times, factors that might affect recovery, and any relevant medical guidelines.
+""",
+    'resources': """
+Based on the uploaded medical resources, identify the required medical resources, treatments, and specialists needed for a patient with:
+Symptoms: {symptoms}
+Patient Details: {patient_details}
+Please provide a detailed list of medications, equipment, specialized care, and healthcare professionals that would be needed.
+""",
+    'default': """
+Based on the uploaded medical resources, analyze the following patient information:
+Symptoms: {symptoms}
+Patient Details: {patient_details}
+Please provide a comprehensive analysis including possible conditions, recommended treatments, and required medical resources.
+""",
+}
+
+# Prompt template for free-form queries
+GENERAL_PROMPT = """
+Based on the medical documents in the database, please analyze the following query:
+{query_text}
+
+Your analysis should include:
+1. Potential disease identification
+2. Estimated recovery time
+3. Required medical resources for treatment
+
+Please be detailed and specific.
+"""
 
 # Helper function to check allowed file extensions
 def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    dot = filename.rfind('.')
+    return dot >= 0 and filename[dot + 1:].lower() in ALLOWED_EXTENSIONS
+
+# Helper function to list uploaded PDFs; cached until the folder changes
+@lru_cache(maxsize=4)
+def _list_pdfs(folder, mtime_ns):
+    return tuple(entry.name for entry in os.scandir(folder) if entry.name.lower().endswith('.pdf'))
+
+def list_documents():
+    folder = app.config['UPLOAD_FOLDER']
+    try:
+        mtime_ns = os.stat(folder).st_mtime_ns
+    except FileNotFoundError:
+        return []
+    return list(_list_pdfs(folder, mtime_ns))
+
+# How long (seconds) a database health result is reused
+HEALTH_CACHE_TTL = 10
+_health_cache = {'checked_at': None, 'healthy': False}
+
+# Helper function to check the vector database has content
+def check_database_health():
+    # A chunk count is enough to know the database is usable; avoid a full RAG query
+    now = time.monotonic()
+    if _health_cache['checked_at'] is not None and now - _health_cache['checked_at'] < HEALTH_CACHE_TTL:
+        return _health_cache['healthy']
+    try:
+        healthy = get_db()._collection.count() > 0
+    except Exception:
+        healthy = False
+    _health_cache.update(checked_at=now, healthy=healthy)
+    return healthy
+
+def invalidate_database_health():
+    _health_cache['checked_at'] = None
 
 # Home route
 @app.route('/')
 def home():
     # Get list of currently loaded documents
-    documents = []
-    if os.path.exists(app.config['UPLOAD_FOLDER']):
-        documents = [f for f in os.listdir(app.config['UPLOAD_FOLDER']) if f.endswith('.pdf')]
-    return render_template('index.html', documents=documents)
+    return render_template('index.html', documents=list_documents())
 
 # Route for document upload
 @app.route('/upload', methods=['POST'])
@@ -42,20 +142,19 @@ def upload_document():
         return redirect(url_for('home'))
     
     if file and allowed_file(file.filename):
-        # Create upload folder if it doesn't exist
-        if not os.path.exists(app.config['UPLOAD_FOLDER']):
-            os.makedirs(app.config['UPLOAD_FOLDER'])
-        
         # Save the file
         filename = secure_filename(file.filename)
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
         file.save(filepath)
         
         try:
-            # Process the newly uploaded document
-            documents = load_documents()
-            chunks = split_documents(documents)
+            # Process only the newly uploaded document
+            chunks = split_documents(iter_documents([filepath]))
+            # An upload may overwrite an earlier file of the same name
+            remove_documents([filepath])
             add_to_chroma(chunks)
+            mark_ingested([filepath])
+            invalidate_database_health()
             flash(f'Medical document {filename} uploaded and processed successfully!')
         except Exception as e:
             flash(f'Error processing medical document: {str(e)}')
@@ -70,11 +169,17 @@ def upload_document():
 def reset_db():
     try:
         clear_database()
+        invalidate_database_health()
         flash('Medical database has been reset successfully!')
     except Exception as e:
         flash(f'Error resetting database: {str(e)}')
     return redirect(url_for('home'))
 
+# Route for checking the medical database status
+@app.route('/api/health')
+def health_check():
+    return jsonify({'healthy': check_database_health(), 'documents': len(list_documents())})
+
 # Route for structured medical queries
 @app.route('/api/medical-query', methods=['POST'])
 def medical_query():
@@ -88,36 +193,14 @@ def medical_query():
     
     try:
         # Format the query based on query type
-        if query_type == 'disease':
-            formatted_query = f"""
-Based on the uploaded medical resources, identify the possible disease(s) with the following symptoms and patient details:
-Symptoms: {symptoms}
-Patient Details: {patient_details}
-Please list the most likely conditions in order of probability, with brief explanations for each.
-"""
-        elif query_type == 'recovery':
-            formatted_query = f"""
-Based on the uploaded medical resources, estimate the recovery time for a patient with the following details:
-Symptoms: {symptoms}
-Patient Details: {patient_details}
-Please provide a range of expected recovery times, factors that might affect recovery, and any relevant medical guidelines.
-"""
-        elif query_type == 'resources':
-            formatted_query = f"""
-Based on the uploaded medical resources, identify the required medical resources, treatments, and specialists needed for a patient with:
-Symptoms: {symptoms}
-Patient Details: {patient_details}
-Please provide a detailed list of medications, equipment, specialized care, and healthcare professionals that would be needed.
-"""
-        else:
-            formatted_query = f"""
-Based on the uploaded medical resources, analyze the following patient information:
-Symptoms: {symptoms}
-Patient Details: {patient_details}
-Please provide a comprehensive analysis including possible conditions, recommended treatments, and required medical resources.
-"""
+        formatted_query = MEDICAL_PROMPTS.get(query_type, MEDICAL_PROMPTS['default']).format_map({
+            'symptoms': symptoms,
+            'patient_details': patient_details
+        })
             
-        # Query the RAG system with the formatted prompt
+        # Query the RAG system with the formatted prompt. Only exact repeats are
+        # served from cache: near-identical patient details can still call for a
+        # different answer, so the semantic cache is not used here.
         result = query_rag(formatted_query)
         return jsonify({'result': result})
     except Exception as e:
@@ -134,21 +217,13 @@ def api_query():
     
     try:
         # Add a prefix to guide the response format
-        enhanced_query = f"""
-Based on the medical documents in the database, please analyze the following query:
-{query_text}
-
-Your analysis should include:
-1. Potential disease identification
-2. Estimated recovery time
-3. Required medical resources for treatment
-
-Please be detailed and specific.
-"""
-        result = query_rag(enhanced_query)
+        enhanced_query = GENERAL_PROMPT.format_map({'query_text': query_text})
+        # Paraphrases are matched on the user's own text, not the whole prompt
+        result = query_rag(enhanced_query, similar_text=query_text, similar_scope='general')
         return jsonify({'result': result})
     except Exception as e:
         return jsonify({'error': str(e)})
 
 if __name__ == '__main__':
+    # Development server only; use gunicorn.conf.py to serve concurrent queries
     app.run(debug=True)
\ No newline at end of file
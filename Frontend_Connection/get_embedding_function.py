@@ -1,7 +1,11 @@
+from functools import lru_cache
+
 from langchain_community.embeddings.ollama import OllamaEmbeddings
 # from langchain_community.embeddings.bedrock import BedrockEmbeddings
 
 
+# One embedder per process; it survives reset_db() and is shared by every caller.
+@lru_cache(maxsize=1)
 def get_embedding_function():
     # embeddings = BedrockEmbeddings(
     #     credentials_profile_name="default", region_name="us-east-1"
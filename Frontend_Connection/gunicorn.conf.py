@@ -0,0 +1,12 @@
+# Production server settings: `gunicorn -c gunicorn.conf.py app:app`
+# RAG queries spend almost all their time waiting on Ollama and the vector DB,
+# so cooperative gevent workers let each process serve many queries at once
+# instead of tying up one sync worker for the full LLM latency.
+import os
+
+bind = os.environ.get('BIND', '127.0.0.1:5000')
+worker_class = 'gevent'
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+worker_connections = 1000
+# LLM responses can take well over the default 30s
+timeout = 300
@@ -1,16 +1,35 @@
 import argparse
 import os
 import shutil
-from langchain.document_loaders.pdf import PyPDFDirectoryLoader
+import stat
+import tempfile
+from collections.abc import Iterable
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from itertools import groupby
+import orjson
+from langchain.document_loaders.pdf import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain.schema.document import Document
-from get_embedding_function import get_embedding_function
-from langchain.vectorstores.chroma import Chroma
+from rag_client import CHROMA_PATH, get_db, reset_db
+from response_cache import clear_response_cache, close_response_cache
 from tqdm import tqdm  # Import tqdm for progress bars
 
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, manifest updates are not serialized
+    fcntl = None
+
 
-CHROMA_PATH = "chroma"
 DATA_PATH = "data"
+# Max IDs per Chroma existence lookup; keeps the SQL IN-list bounded.
+ID_LOOKUP_BATCH_SIZE = 10_000
+# Chunks per add_documents call, and how many calls run at once.
+ADD_BATCH_SIZE = 256
+ADD_WORKERS = 4
+# Records (mtime, size) of every ingested PDF; lives in the DB dir so a reset clears it.
+MANIFEST_PATH = os.path.join(CHROMA_PATH, "ingested.json")
+MANIFEST_LOCK_PATH = MANIFEST_PATH + ".lock"
 
 
 def main():
@@ -23,9 +42,15 @@ def main():
         print("✨ Clearing Database")
         clear_database()
 
+    # Only PDFs that are new or changed since the last run need loading.
+    paths = find_changed_documents()
+    if not paths:
+        print("✅ No new or changed documents")
+        return
+
     # Create (or update) the data store.
     print("📄 Loading documents...")
-    documents = load_documents()
+    documents = load_documents(paths=paths)
     print(f"Found {len(documents)} documents")
     
     print("✂️ Splitting documents...")
@@ -33,93 +58,193 @@ def main():
     print(f"Created {len(chunks)} chunks")
     
     print("💾 Adding to database...")
+    remove_documents(paths)
     add_to_chroma(chunks)
-
-
-def load_documents():
-    document_loader = PyPDFDirectoryLoader(DATA_PATH)
-    return document_loader.load()
-
-
-def split_documents(documents: list[Document]):
+    mark_ingested(paths)
+
+
+def load_documents(paths: list[str] | None = None):
+    # Load only the given PDFs, or everything in the data directory.
+    if paths is None:
+        paths = find_pdfs()
+    if len(paths) < 2:
+        return list(iter_documents(paths))
+    # PDF parsing is CPU-bound, so spread files across processes (order is kept).
+    with ProcessPoolExecutor() as executor:
+        loaded = list(tqdm(executor.map(load_pdf, paths), total=len(paths), desc="Loading PDFs"))
+    return [page for pages in loaded for page in pages]
+
+
+def find_pdfs(directory: str = DATA_PATH):
+    # scandir entries carry their type from the directory listing, so no per-file stat.
+    paths = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            if entry.is_dir():
+                paths.extend(find_pdfs(entry.path))
+            elif entry.name.lower().endswith(".pdf"):
+                paths.append(entry.path)
+    return sorted(paths)
+
+
+def load_pdf(path: str):
+    return PyPDFLoader(path).load()
+
+
+def iter_documents(paths: list[str]):
+    # Yield pages one at a time so a large PDF is never held in memory whole.
+    for path in paths:
+        yield from PyPDFLoader(path).lazy_load()
+
+
+def file_signature(path: str):
+    file_stat = os.stat(path)
+    return [file_stat.st_mtime_ns, file_stat.st_size]
+
+
+def load_manifest():
+    if not os.path.exists(MANIFEST_PATH):
+        return {}
+    with open(MANIFEST_PATH, "rb") as f:
+        return orjson.loads(f.read())
+
+
+def find_changed_documents():
+    # Compare each PDF's (mtime, size) with the manifest; no file contents are read.
+    manifest = load_manifest()
+    return [path for path in find_pdfs() if manifest.get(path) != file_signature(path)]
+
+
+def mark_ingested(paths: list[str]):
+    os.makedirs(CHROMA_PATH, exist_ok=True)
+    # Uploads in different workers may update the manifest at once; the lock
+    # keeps one writer's entries from overwriting another's.
+    with manifest_lock():
+        manifest = load_manifest()
+        manifest.update({path: file_signature(path) for path in paths})
+        # Write a private temp file then rename, so a crash never leaves a
+        # truncated manifest behind (which would force every PDF to be re-ingested).
+        fd, tmp_path = tempfile.mkstemp(dir=CHROMA_PATH, prefix="ingested.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(orjson.dumps(manifest))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, MANIFEST_PATH)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+@contextmanager
+def manifest_lock():
+    with open(MANIFEST_LOCK_PATH, "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+
+def split_documents(documents: Iterable[Document]):
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=800,
         chunk_overlap=80,
         length_function=len,
         is_separator_regex=False,
     )
-    return text_splitter.split_documents(documents)
+    # Split page by page so lazily loaded pages can be released as we go;
+    # the splitter treats each document independently, so chunks are unchanged.
+    chunks = []
+    for document in documents:
+        chunks.extend(text_splitter.split_documents([document]))
+    return chunks
 
 
 def add_to_chroma(chunks: list[Document]):
     # Load the existing database.
-    db = Chroma(
-        persist_directory=CHROMA_PATH, embedding_function=get_embedding_function()
-    )
+    db = get_db()
 
     # Calculate Page IDs.
     chunks_with_ids = calculate_chunk_ids(chunks)
 
     # Add or Update the documents.
-    existing_items = db.get(include=[])  # IDs are always included by default
-    existing_ids = set(existing_items["ids"])
-    print(f"Number of existing documents in DB: {len(existing_ids)}")
+    # Look up only the candidate IDs rather than pulling every ID in the DB.
+    candidate_ids = [chunk.metadata["id"] for chunk in chunks_with_ids]
+    existing_ids = set()
+    for i in range(0, len(candidate_ids), ID_LOOKUP_BATCH_SIZE):
+        batch_ids = candidate_ids[i:i + ID_LOOKUP_BATCH_SIZE]
+        existing_ids.update(db.get(ids=batch_ids, include=[])["ids"])  # IDs are always included by default
+    print(f"Number of these chunks already in DB: {len(existing_ids)}")
 
     # Only add documents that don't exist in the DB.
-    new_chunks = []
-    for chunk in tqdm(chunks_with_ids, desc="Filtering chunks"):
-        if chunk.metadata["id"] not in existing_ids:
-            new_chunks.append(chunk)
+    new_chunks = [chunk for chunk in chunks_with_ids if chunk.metadata["id"] not in existing_ids]
 
     if len(new_chunks):
         print(f"👉 Adding new documents: {len(new_chunks)}")
         new_chunk_ids = [chunk.metadata["id"] for chunk in new_chunks]
         
-        # Add documents in batches with progress bar
-        batch_size = 50
-        for i in tqdm(range(0, len(new_chunks), batch_size), desc="Adding to database"):
-            batch = new_chunks[i:min(i+batch_size, len(new_chunks))]
-            batch_ids = new_chunk_ids[i:min(i+batch_size, len(new_chunk_ids))]
-            db.add_documents(batch, ids=batch_ids)
+        # Add documents in batches with progress bar. Batches run concurrently so
+        # embedding requests for one batch overlap with the writes of another.
+        with ThreadPoolExecutor(max_workers=ADD_WORKERS) as executor:
+            futures = [
+                executor.submit(db.add_documents, new_chunks[i:i + ADD_BATCH_SIZE], ids=new_chunk_ids[i:i + ADD_BATCH_SIZE])
+                for i in range(0, len(new_chunks), ADD_BATCH_SIZE)
+            ]
+            for future in tqdm(as_completed(futures), total=len(futures), desc="Adding to database"):
+                future.result()
         
         db.persist()
+        clear_response_cache()
     else:
         print("✅ No new documents to add")
 
 
+def remove_documents(paths: list[str]):
+    # Drop every chunk of these files. Chunk IDs only encode position, so a changed
+    # file would otherwise keep its old chunks and its new content would be skipped.
+    db = get_db()
+    stale_ids = []
+    for path in paths:
+        stale_ids.extend(db.get(where={"source": path}, include=[])["ids"])
+    if stale_ids:
+        print(f"🗑️ Removing outdated chunks: {len(stale_ids)}")
+        db.delete(ids=stale_ids)
+        db.persist()
+        clear_response_cache()
+
+
 def calculate_chunk_ids(chunks):
     # This will create IDs like "data/monopoly.pdf:6:2"
     # Page Source : Page Number : Chunk Index
 
     print("🔢 Calculating chunk IDs...")
-    last_page_id = None
-    current_chunk_index = 0
-
-    # Add progress bar for chunk ID calculation
-    for chunk in tqdm(chunks, desc="Processing chunks"):
-        source = chunk.metadata.get("source")
-        page = chunk.metadata.get("page")
-        current_page_id = f"{source}:{page}"
 
-        # If the page ID is the same as the last one, increment the index.
-        if current_page_id == last_page_id:
-            current_chunk_index += 1
-        else:
-            current_chunk_index = 0
+    # Consecutive chunks from the same page share a group; the index restarts per page.
+    def page_key(chunk):
+        return chunk.metadata.get("source"), chunk.metadata.get("page")
 
-        # Calculate the chunk ID.
-        chunk_id = f"{current_page_id}:{current_chunk_index}"
-        last_page_id = current_page_id
-
-        # Add it to the page meta-data.
-        chunk.metadata["id"] = chunk_id
+    for (source, page), page_chunks in groupby(chunks, key=page_key):
+        for chunk_index, chunk in enumerate(page_chunks):
+            # Add it to the page meta-data.
+            chunk.metadata["id"] = f"{source}:{page}:{chunk_index}"
 
     return chunks
 
 
 def clear_database():
+    reset_db()
+    # Answers came from the documents being removed.
+    clear_response_cache()
+    close_response_cache()
     if os.path.exists(CHROMA_PATH):
-        shutil.rmtree(CHROMA_PATH)
+        shutil.rmtree(CHROMA_PATH, onerror=force_remove)
+
+
+def force_remove(func, path, exc_info):
+    # Only entries that refused removal (e.g. read-only files) get their permissions fixed.
+    os.chmod(path, stat.S_IWRITE)
+    func(path)
 
 
 if __name__ == "__main__":
@@ -1,11 +1,15 @@
 import argparse
-from langchain_community.vectorstores import Chroma
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from langchain.prompts import ChatPromptTemplate
 from langchain_community.llms.ollama import Ollama
 
-from get_embedding_function import get_embedding_function
-
-CHROMA_PATH = "chroma"
+from rag_client import get_db
+from response_cache import (
+    get_cached_response, cache_response, get_cached_embedding, cache_embedding,
+    find_similar_response, cache_similar_response,
+)
 
 PROMPT_TEMPLATE = """
 Answer the question based only on the following context:
@@ -17,6 +21,17 @@ Answer the question based only on the following context:
 Answer the question based on the above context: {question}
 """
 
+# Upper bound on a single LLM completion, in seconds. Also passed to the client,
+# where it bounds each read, so a stalled stream fails instead of hanging.
+LLM_TIMEOUT = 300
+
+# Parsed once; neither depends on the query.
+PROMPT = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
+MODEL = Ollama(model="llama3.2", num_thread=8, timeout=LLM_TIMEOUT)
+
+# Query embeddings run here so they overlap with the response cache lookup.
+EMBED_POOL = ThreadPoolExecutor(max_workers=4)
+
 
 def main():
     # Create CLI.
@@ -24,30 +39,122 @@ def main():
     parser.add_argument("query_text", type=str, help="The query text.")
     args = parser.parse_args()
     query_text = args.query_text
-    query_rag(query_text)
 
+    # Print the answer as it is generated rather than after it completes.
+    sources = []
+    print("Response: ", end="", flush=True)
+    for chunk in stream_rag(query_text, sources, similar_text=query_text):
+        print(chunk, end="", flush=True)
+    print(f"\nSources: {sources}")
 
-def query_rag(query_text: str):
-    # Prepare the DB.
-    embedding_function = get_embedding_function()
-    db = Chroma(persist_directory=CHROMA_PATH, embedding_function=embedding_function)
 
-    # Search the DB.
-    results = db.similarity_search_with_score(query_text, k=5)
+def query_rag(query_text: str, similar_text: str | None = None, similar_scope: str = "query"):
+    return asyncio.run(query_rag_async(query_text, similar_text, similar_scope))
+
+
+async def query_many(queries: list[str]):
+    # Independent queries overlap; Ollama serves up to OLLAMA_NUM_PARALLEL of
+    # them at once (and OLLAMA_MAX_LOADED_MODELS bounds resident models).
+    return await asyncio.gather(*(query_rag_async(query_text) for query_text in queries))
 
-    context_text = "\n\n---\n\n".join([doc.page_content for doc, _score in results])
-    prompt_template = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
-    prompt = prompt_template.format(context=context_text, question=query_text)
-    # print(prompt)
 
-    model = Ollama(model="llama3.2", num_thread=8)
-    response_text = model.invoke(prompt)
+async def query_rag_async(query_text: str, similar_text: str | None = None, similar_scope: str = "query"):
+    # Retrieval blocks, so it runs off the event loop.
+    cached, similar_key, results = await asyncio.to_thread(retrieve, query_text, similar_text, similar_scope)
+    if cached is not None:
+        print(f"Response (cached): {cached}")
+        return cached
+
+    prompt = build_prompt(results, query_text)
+    response_text = await asyncio.wait_for(MODEL.ainvoke(prompt), timeout=LLM_TIMEOUT)
 
     sources = [doc.metadata.get("id", None) for doc, _score in results]
     formatted_response = f"Response: {response_text}\nSources: {sources}"
     print(formatted_response)
+    remember_answer(query_text, similar_key, response_text)
     return response_text
 
 
+def stream_rag(query_text: str, sources: list | None = None,
+               similar_text: str | None = None, similar_scope: str = "query"):
+    # Yield the answer piece by piece as the LLM produces it. Source chunk IDs
+    # are appended to `sources` when given.
+    cached, similar_key, results = retrieve(query_text, similar_text, similar_scope)
+    if cached is not None:
+        yield cached
+        return
+
+    if sources is not None:
+        sources.extend(doc.metadata.get("id", None) for doc, _score in results)
+
+    started = time.monotonic()
+    parts = []
+    for chunk in MODEL.stream(build_prompt(results, query_text)):
+        parts.append(chunk)
+        yield chunk
+        if time.monotonic() - started > LLM_TIMEOUT:
+            # Stop generating; a truncated answer is not cached.
+            return
+
+    remember_answer(query_text, similar_key, "".join(parts))
+
+
+def retrieve(query_text: str, similar_text: str | None = None, similar_scope: str = "query"):
+    # Shared first half of every query. Returns (cached_answer, similar_key,
+    # results): a cached answer when one applies, otherwise the search results.
+    #
+    # The semantic cache is only consulted when the caller passes `similar_text`:
+    # the user-supplied part of the query, without any prompt template (whose
+    # fixed wording would make unrelated queries look alike). Entries only
+    # match others cached under the same `similar_scope`.
+    db = get_db()
+
+    # The exact-match lookup runs alongside the embeddings, so a miss costs no
+    # extra round trip.
+    embedding = EMBED_POOL.submit(embed_query, db, query_text)
+    similar_embedding = None
+    if similar_text is not None and similar_text != query_text:
+        similar_embedding = EMBED_POOL.submit(embed_query, db, similar_text)
+    cached = get_cached_response(query_text)
+    if cached is not None:
+        return cached, None, []
+
+    query_embedding = embedding.result()
+    similar_key = None
+    if similar_text is not None:
+        key_embedding = similar_embedding.result() if similar_embedding else query_embedding
+        similar_key = (key_embedding, similar_scope)
+        similar = find_similar_response(key_embedding, similar_scope)
+        if similar is not None:
+            return similar, similar_key, []
+
+    # Search the DB.
+    results = db.similarity_search_by_vector_with_relevance_scores(query_embedding, k=5)
+    return None, similar_key, results
+
+
+def remember_answer(query_text: str, similar_key, response_text: str):
+    cache_response(query_text, response_text)
+    if similar_key is not None:
+        key_embedding, similar_scope = similar_key
+        cache_similar_response(key_embedding, response_text, similar_scope)
+
+
+def embed_query(db, query_text: str):
+    # Repeated queries skip the embedding model.
+    embedding = get_cached_embedding(query_text)
+    if embedding is None:
+        embedding = db.embeddings.embed_query(query_text)
+        cache_embedding(query_text, embedding)
+    return embedding
+
+
+def build_prompt(results, query_text: str):
+    context_text = "\n\n---\n\n".join([doc.page_content for doc, _score in results])
+    prompt = PROMPT.format(context=context_text, question=query_text)
+    # print(prompt)
+    return prompt
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,45 @@
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from langchain_community.vectorstores import Chroma
+
+from get_embedding_function import get_embedding_function
+
+CHROMA_PATH = "chroma"
+CHROMA_SQLITE_PATH = os.path.join(CHROMA_PATH, "chroma.sqlite3")
+
+_lock = threading.Lock()
+_db = None
+
+
+def get_db():
+    # Open the Chroma store (and load the embedding model) once per process.
+    global _db
+    if _db is None:
+        with _lock:
+            if _db is None:
+                tune_sqlite()
+                _db = Chroma(
+                    persist_directory=CHROMA_PATH,
+                    embedding_function=get_embedding_function(),
+                )
+    return _db
+
+
+def reset_db():
+    # Forget the open store, e.g. before its directory is deleted.
+    global _db
+    with _lock:
+        _db = None
+
+
+def tune_sqlite():
+    # Chroma keeps its metadata in SQLite. WAL mode is stored in the file itself,
+    # so it sticks for Chroma's own connections; per-connection settings
+    # (synchronous, cache_size, mmap_size) would not, so they are not set here.
+    if not os.path.exists(CHROMA_SQLITE_PATH):
+        return
+    with closing(sqlite3.connect(CHROMA_SQLITE_PATH)) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA optimize")
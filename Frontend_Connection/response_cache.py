@@ -0,0 +1,219 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from rag_client import CHROMA_PATH
+
+# Answers depend on the indexed documents, so they live next to the vector
+# store and are dropped along with it on reset.
+CACHE_PATH = os.path.join(CHROMA_PATH, "response_cache.sqlite3")
+CACHE_TTL = 24 * 60 * 60  # seconds
+CACHE_MAX_ENTRIES = 1000
+
+# Query embeddings only depend on the text, so they are kept longer than
+# answers and survive clear_response_cache(). Stored as float16: half the
+# size, and the rounding is far below what moves a nearest-neighbour search.
+EMBEDDING_CACHE_MAX_ENTRIES = 10_000
+
+# Paraphrased questions reuse an answer when their embeddings are this close
+# (cosine similarity). Callers embed only the user-supplied text, never a
+# prompt template, and entries are only compared within the same scope. Kept in memory only; a brute-force scan over this many
+# vectors takes well under a millisecond. Entries expire after CACHE_TTL, and
+# each process drops its entries when the generation token stored in the cache
+# file changes (on clear, or when the file is recreated after a reset).
+SIMILARITY_THRESHOLD = 0.95
+SEMANTIC_CACHE_MAX_ENTRIES = 1000
+
+_lock = threading.Lock()
+_query_embeddings = None  # (n, dim) float16 matrix of unit-length query embeddings
+_similar_responses = []
+_similar_scopes = []  # scope each entry was cached under
+_similar_created = np.empty(0)  # creation time of each entry
+_generation = None  # token of the cache file the entries belong to
+_conn = None
+_conn_inode = None
+
+
+def _connection():
+    # One connection per process, used with _lock held. It is reopened, and the
+    # schema created, only when the cache file is new (e.g. after a reset
+    # removed the store, possibly from another process).
+    global _conn, _conn_inode
+    try:
+        inode = os.stat(CACHE_PATH).st_ino
+    except FileNotFoundError:
+        inode = None
+    if _conn is None or inode != _conn_inode:
+        _close_connection()
+        os.makedirs(CHROMA_PATH, exist_ok=True)
+        conn = sqlite3.connect(CACHE_PATH, check_same_thread=False)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, response TEXT, created REAL, last_used REAL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS query_embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB, last_used REAL)"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS generation (token TEXT)")
+        conn.commit()
+        _conn, _conn_inode = conn, os.stat(CACHE_PATH).st_ino
+    return _conn
+
+
+def _close_connection():
+    global _conn, _conn_inode
+    if _conn is not None:
+        _conn.close()
+        _conn, _conn_inode = None, None
+
+
+def close_response_cache():
+    # Release the cache file, e.g. before the store directory is deleted.
+    with _lock:
+        _close_connection()
+
+
+def _cache_key(query_text: str):
+    return hashlib.sha256(query_text.encode()).hexdigest()
+
+
+def get_cached_response(query_text: str):
+    # Return the stored answer for this exact query, or None if missing or expired.
+    key = _cache_key(query_text)
+    now = time.time()
+    with _lock, _connection() as conn:
+        row = conn.execute(
+            "SELECT response FROM cache WHERE key = ? AND created > ?",
+            (key, now - CACHE_TTL),
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE cache SET last_used = ? WHERE key = ?", (now, key))
+    return row[0]
+
+
+def cache_response(query_text: str, response: str):
+    now = time.time()
+    with _lock, _connection() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, response, created, last_used) VALUES (?, ?, ?, ?)",
+            (_cache_key(query_text), response, now, now),
+        )
+        # Evict the least recently used answers beyond the size cap.
+        conn.execute(
+            "DELETE FROM cache WHERE key NOT IN "
+            "(SELECT key FROM cache ORDER BY last_used DESC, rowid DESC LIMIT ?)",
+            (CACHE_MAX_ENTRIES,),
+        )
+
+
+def get_cached_embedding(query_text: str):
+    # Return the stored embedding for this exact query, or None.
+    key = _cache_key(query_text)
+    with _lock, _connection() as conn:
+        row = conn.execute("SELECT vector FROM query_embeddings WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE query_embeddings SET last_used = ? WHERE key = ?", (time.time(), key))
+    return np.frombuffer(row[0], dtype=np.float16).tolist()
+
+
+def cache_embedding(query_text: str, embedding):
+    vector = np.asarray(embedding, dtype=np.float16).tobytes()
+    with _lock, _connection() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO query_embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+            (_cache_key(query_text), vector, time.time()),
+        )
+        conn.execute(
+            "DELETE FROM query_embeddings WHERE key NOT IN "
+            "(SELECT key FROM query_embeddings ORDER BY last_used DESC, rowid DESC LIMIT ?)",
+            (EMBEDDING_CACHE_MAX_ENTRIES,),
+        )
+
+
+def _unit_vector(embedding):
+    vector = np.asarray(embedding, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def _current_generation(conn):
+    # A fresh cache file gets a new token, so a reset also invalidates every process.
+    row = conn.execute("SELECT token FROM generation").fetchone()
+    if row is not None:
+        return row[0]
+    token = uuid.uuid4().hex
+    conn.execute("INSERT INTO generation (token) VALUES (?)", (token,))
+    return token
+
+
+def _sync_semantic_cache(conn):
+    # Drop this process's entries if the cache was cleared elsewhere, and any
+    # that have outlived CACHE_TTL. Call with _lock held.
+    global _query_embeddings, _similar_responses, _similar_scopes, _similar_created, _generation
+    token = _current_generation(conn)
+    if token != _generation:
+        _generation = token
+        _query_embeddings = None
+        _similar_responses = []
+        _similar_scopes = []
+        _similar_created = np.empty(0)
+    elif _query_embeddings is not None:
+        live = _similar_created > time.time() - CACHE_TTL
+        if not live.all():
+            _query_embeddings = _query_embeddings[live] if live.any() else None
+            _similar_responses = [r for r, keep in zip(_similar_responses, live) if keep]
+            _similar_scopes = [r for r, keep in zip(_similar_scopes, live) if keep]
+            _similar_created = _similar_created[live]
+
+
+def find_similar_response(query_embedding, scope: str):
+    # Return the answer to the most similar earlier query in this scope, if it
+    # is close enough.
+    vector = _unit_vector(query_embedding)
+    with _lock, _connection() as conn:
+        _sync_semantic_cache(conn)
+        if _query_embeddings is None:
+            return None
+        similarities = _query_embeddings.astype(np.float32) @ vector
+        in_scope = np.fromiter((s == scope for s in _similar_scopes), dtype=bool, count=len(_similar_scopes))
+        similarities[~in_scope] = -1.0
+        best = int(similarities.argmax())
+        if similarities[best] >= SIMILARITY_THRESHOLD:
+            return _similar_responses[best]
+    return None
+
+
+def cache_similar_response(query_embedding, response: str, scope: str):
+    global _query_embeddings, _similar_responses, _similar_scopes, _similar_created
+    vector = _unit_vector(query_embedding).astype(np.float16)[np.newaxis]
+    with _lock, _connection() as conn:
+        _sync_semantic_cache(conn)
+        if _query_embeddings is None:
+            _query_embeddings = vector
+        else:
+            # Oldest entries fall off once the cache is full.
+            _query_embeddings = np.vstack([_query_embeddings, vector])[-SEMANTIC_CACHE_MAX_ENTRIES:]
+        _similar_responses = (_similar_responses + [response])[-SEMANTIC_CACHE_MAX_ENTRIES:]
+        _similar_scopes = (_similar_scopes + [scope])[-SEMANTIC_CACHE_MAX_ENTRIES:]
+        _similar_created = np.append(_similar_created, time.time())[-SEMANTIC_CACHE_MAX_ENTRIES:]
+
+
+def clear_response_cache():
+    # Called when new documents are indexed, since earlier answers may be stale.
+    # A new generation token makes every other process drop its semantic cache too.
+    global _query_embeddings, _similar_responses, _similar_scopes, _similar_created, _generation
+    with _lock, _connection() as conn:
+        conn.execute("DELETE FROM cache")
+        conn.execute("DELETE FROM generation")
+        _generation = _current_generation(conn)
+        _query_embeddings = None
+        _similar_responses = []
+        _similar_scopes = []
+        _similar_created = np.empty(0)